@@ -1,23 +1,116 @@
 import re
 import subprocess
-import json
 import logging
 import asyncio
+import random
+import time
+import aiohttp
+from bech32 import bech32_decode, bech32_encode, convertbits
+
+try:
+    from orjson import loads as json_loads
+except ModuleNotFoundError:
+    from json import loads as json_loads
 
 from clients.faucet_client import FaucetClient, Balance, NodeStatus, NetworkDenomPair, TxInfo
 
+SESSION = None
+
+TX_SEND_ATTEMPTS = 5
+# sdk codespace: mempool is full, account sequence mismatch
+RETRYABLE_TX_CODES = (20, 32)
+
+# Node status only changes once per block, so concurrent status requests share one query
+NODE_STATUS_TTL = 1.5
+
+BECH32_ACC_PATTERN = re.compile(r'Bech32 Acc: (\S+)')
+
+# A hung node must not stall the coalesced callers and the transactions queue for aiohttp's default 5 minutes
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    HTTP session shared by every CosmosClient, so node queries reuse pooled keep-alive connections
+    """
+    global SESSION
+    if SESSION is None or SESSION.closed:
+        SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=16, keepalive_timeout=75, enable_cleanup_closed=True),
+            raise_for_status=True,
+            timeout=HTTP_TIMEOUT)
+    return SESSION
+
+
+async def fetch_json(url: str, params: dict = None):
+    """
+    GET the given url on the shared session and decode its JSON body
+    """
+    async with get_session().get(url, params=params) as response:
+        return await response.json(loads=json_loads, content_type=None)
+
+
+async def close_session():
+    """
+    Close the shared HTTP session, if it was opened
+    """
+    if SESSION is not None and not SESSION.closed:
+        await SESSION.close()
+
 
 class CosmosClient(FaucetClient):
 
-    async def execute(self, params, chain_id=True, json_output=True, json_node=True):
-        params = [self.node_executable] + params
-        if json_node:
-            params.append(f"--node={self.node_rpc}")
-        if chain_id:
-            params.append(f"--chain-id={self.node_chain_id}")
-        if json_output:
-            params.append('--output=json')
+    def __init__(self, key, **args):
+        super().__init__(key, **args)
+        # address_prefix may include the bech32 separator, e.g. 'dym1'
+        self.bech32_hrp = self.address_prefix.removesuffix('1')
+        # IBC denom traces never change for a given hash, so they are resolved once per denom
+        self.denom_traces = {}
+        self.node_status = None
+        self.node_status_time = 0.0
+        self.node_status_lock = asyncio.Lock()
+        self.inflight = {}
+        # Flags appended to every node command, formatted once
+        self.node_flag = f"--node={self.node_rpc}"
+        self.chain_id_flag = f"--chain-id={self.node_chain_id}"
+
+    async def single_flight(self, key, query):
+        """
+        Runs query() once for all concurrent callers with the same key, sharing its result
+        """
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(query())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # A cancelled caller must not cancel the query for the others
+        return await asyncio.shield(task)
+
+    async def http_get(self, url: str, params: dict = None):
+        """
+        GETs are idempotent, so identical concurrent requests are coalesced
+        """
+        key = (url, tuple(sorted(params.items())) if params else ())
+        return await self.single_flight(key, lambda: fetch_json(url, params))
 
+    async def query_rpc(self, path: str, params: dict = None):
+        """
+        GET <node_rpc>/<path> on the Tendermint RPC
+        """
+        body = await self.http_get(f'{self.node_rpc.rstrip("/")}/{path}', params)
+        return body['result']
+
+    async def query_api(self, path: str, params: dict = None):
+        """
+        GET <node_api>/<path> on the Cosmos REST API
+        """
+        return await self.http_get(f'{self.node_api.rstrip("/")}/{path}', params)
+
+    async def run(self, params):
+        """
+        Spawns node_executable with the given params and returns its raw stdout and stderr
+        """
+        params = [self.node_executable] + params
         process = await asyncio.create_subprocess_exec(
             *params,
             stdout=asyncio.subprocess.PIPE,
@@ -26,36 +119,60 @@ class CosmosClient(FaucetClient):
 
         # Wait for the subprocess to complete
         stdout, stderr = await process.communicate()
-        stdout = stdout.decode("utf-8")
-        stderr = stderr.decode("utf-8")
 
-        try:
-            if process.returncode:
-                raise subprocess.CalledProcessError(process.returncode, params, stdout, stderr)
-            if json_output:
-                return json.loads(stdout)
-            if stdout:
-                return stdout
-            return stderr
-        except subprocess.CalledProcessError as cpe:
-            output = str(stderr).split('\n', maxsplit=1)
-            logging.error("Called Process Error: %s, stderr: %s", cpe, output)
-            raise cpe
+        if process.returncode:
+            output = stderr.split(b'\n', maxsplit=1)[0].decode("utf-8", "replace")
+            logging.error("Called Process Error: %s returned %d, stderr: %s", params, process.returncode, output)
+            raise subprocess.CalledProcessError(process.returncode, params, stderr=output)
+        return stdout, stderr
+
+    async def execute(self, params, chain_id=True, json_output=True, json_node=True):
+        params = list(params)
+        if json_node:
+            params.append(self.node_flag)
+        if chain_id:
+            params.append(self.chain_id_flag)
+        if json_output:
+            params.append('--output=json')
+
+        if params[0] == 'query':
+            stdout, stderr = await self.single_flight(tuple(params), lambda: self.run(params))
+        else:
+            stdout, stderr = await self.run(params)
+        if json_output:
+            return json_loads(stdout)
+        if stdout:
+            return stdout.decode("utf-8")
+        return stderr.decode("utf-8")
 
     async def get_fixed_balance_denom(self, balance: Balance):
         if balance.denom.startswith('ibc/'):
-            response = await self.execute(["query", "ibc-transfer", "denom-trace", balance.denom])
+            base_denom = self.denom_traces.get(balance.denom)
+            if base_denom is None:
+                if self.node_api:
+                    response = await self.query_api(
+                        f'ibc/apps/transfer/v1/denom_traces/{balance.denom.removeprefix("ibc/")}')
+                else:
+                    response = await self.execute(["query", "ibc-transfer", "denom-trace", balance.denom])
+                base_denom = response['denom_trace']['base_denom']
+                self.denom_traces[balance.denom] = base_denom
             balance.original_denom = balance.denom
-            balance.denom = response['denom_trace']['base_denom']
+            balance.denom = base_denom
         return balance
 
     async def get_balance(self, address: str, original_denom: str) -> Balance:
         """
-        dymd query bank balances <address> <node> <chain-id>
+        GET /cosmos/bank/v1beta1/balances/<address>/by_denom
+        or dymd query bank balances <address> <node> <chain-id>
         """
         try:
-            response = await self.execute(["query", "bank", "balances", address, f'--denom={original_denom}'],
-                                          chain_id=False)
+            if self.node_api:
+                response = await self.query_api(f'cosmos/bank/v1beta1/balances/{address}/by_denom',
+                                                {'denom': original_denom})
+                response = response['balance']
+            else:
+                response = await self.execute(["query", "bank", "balances", address, f'--denom={original_denom}'],
+                                              chain_id=False)
             return await self.get_fixed_balance_denom(Balance(**response))
         except IndexError as index_error:
             logging.error('Parsing error on balance request: %s', index_error)
@@ -63,55 +180,53 @@ class CosmosClient(FaucetClient):
 
     async def get_node_status(self):
         """
-        dymd status <node>
+        GET <node_rpc>/status
         """
-        status = await self.execute(["status"], chain_id=False, json_output=False)
-        status = json.loads(status)
-        try:
-            node_status = NodeStatus(
-                str(status['NodeInfo']['moniker']),
-                str(status['NodeInfo']['network']),
-                int(status['SyncInfo']['latest_block_height']),
-                bool(status['SyncInfo']['catching_up'])
-            )
+        async with self.node_status_lock:
+            if self.node_status and time.monotonic() - self.node_status_time < NODE_STATUS_TTL:
+                return self.node_status
+
+            status = await self.query_rpc('status')
+            try:
+                node_status = NodeStatus(
+                    str(status['node_info']['moniker']),
+                    str(status['node_info']['network']),
+                    int(status['sync_info']['latest_block_height']),
+                    bool(status['sync_info']['catching_up'])
+                )
+            except KeyError as key:
+                logging.error('Key not found in node status: %s', key)
+                raise key
+            self.node_status = node_status
+            self.node_status_time = time.monotonic()
             return node_status
-        except KeyError as key:
-            logging.error('Key not found in node status: %s', key)
-            raise key
 
     async def check_address(self, address: str):
         """
         dymd keys parse <address>
+        Bech32 addresses are decoded locally when the address prefix is known
         """
-        params = [self.node_executable, "keys", "parse", f"{address}", '--output=json']
-        process = await asyncio.create_subprocess_exec(
-            *params,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-
-        # Wait for the subprocess to complete
-        stdout, stderr = await process.communicate()
-        stdout = stdout.decode("utf-8")
-        stderr = stderr.decode("utf-8")
+        if self.bech32_hrp:
+            hrp, data = bech32_decode(address)
+            payload = convertbits(data, 5, 8, False) if data else None
+            if hrp != self.bech32_hrp or not payload:
+                raise ValueError(f'Invalid bech32 address: {address}')
+            return {'human': hrp, 'bytes': bytes(payload).hex().upper()}
 
+        stdout, _ = await self.run(["keys", "parse", f"{address}", '--output=json'])
         try:
-            if process.returncode:
-                raise subprocess.CalledProcessError(process.returncode, params, stdout, stderr)
-            return json.loads(stdout[:-1])
-        except subprocess.CalledProcessError as cpe:
-            output = str(stderr).split('\n', maxsplit=1)
-            logging.error("Called Process Error: %s, stderr: %s", cpe, output)
-            raise cpe
-        except IndexError as index_error:
-            logging.error('Parsing error on address check: %s', index_error)
-            raise index_error
+            return json_loads(stdout)
+        except ValueError as value_error:
+            logging.error('Parsing error on address check: %s', value_error)
+            raise value_error
 
     async def tx_send(self, sender: str, recipient: str, amount: str, fees: int) -> str:
         """
         dymd tx bank send <from address> <to address> <amount> <fees> <node> <chain-id> --keyring-backend=test -y
         """
-        for i in range(5):
+        for attempt in range(TX_SEND_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(min(2 ** attempt * 0.25, 4) + random.random() * 0.1)
             try:
                 response = await self.execute([
                     'tx',
@@ -128,6 +243,10 @@ class CosmosClient(FaucetClient):
                 logging.info("Tx Send response %s", response)
                 if response['code'] == 0:
                     return response['txhash']
+                logging.error('Tx Send failed with code %s in codespace %s: %s',
+                              response['code'], response.get('codespace'), response.get('raw_log'))
+                if response.get('codespace') != 'sdk' or response['code'] not in RETRYABLE_TX_CODES:
+                    break
             except (TypeError, KeyError) as err:
                 logging.critical('Could not read %s in tx response', err)
 
@@ -137,34 +256,45 @@ class CosmosClient(FaucetClient):
         if not address.startswith('0x'):
             return address
 
+        if self.bech32_hrp:
+            data = bytes.fromhex(address.removeprefix('0x'))
+            return bech32_encode(self.bech32_hrp, convertbits(data, 8, 5))
+
         response = await self.execute(
             ['debug', 'addr', address.removeprefix('0x')], chain_id=False, json_output=False, json_node=False)
-        match = re.search(r'Bech32 Acc: [^\s]+', response)
+        match = BECH32_ACC_PATTERN.search(response)
         if match:
-            address = match.group().removeprefix('Bech32 Acc: ')
+            address = match.group(1)
 
         return address
 
     async def get_tx_info(self, hash_id: str) -> TxInfo:
         """
-        dymd query tx <tx-hash> <node> <chain-id>
+        GET /cosmos/tx/v1beta1/txs/<tx-hash>
+        or dymd query tx <tx-hash> <node> <chain-id>
         """
-        tx_response = await self.execute(['query', 'tx', '--type=hash', f'{hash_id}'])
+        if self.node_api:
+            response = await self.query_api(f'cosmos/tx/v1beta1/txs/{hash_id}')
+            tx_response = response['tx_response']
+        else:
+            tx_response = await self.execute(['query', 'tx', '--type=hash', f'{hash_id}'])
         try:
             tx_body = tx_response['tx']['body']['messages'][0]
             height = int(tx_response['height'])
-            if 'from_address' in tx_body.keys():
+            if 'from_address' in tx_body:
+                amount = tx_body['amount'][0]
                 tx_info = TxInfo(
                     height,
                     tx_body['from_address'],
                     tx_body['to_address'],
-                    tx_body['amount'][0]['amount'] + tx_body['amount'][0]['denom'])
-            elif 'sender' in tx_body.keys():
+                    amount['amount'] + amount['denom'])
+            elif 'sender' in tx_body:
+                token = tx_body['token']
                 tx_info = TxInfo(
                     height,
                     tx_body['sender'],
                     tx_body['receiver'],
-                    tx_body['token']['amount'] + tx_body['token']['denom'])
+                    token['amount'] + token['denom'])
             else:
                 logging.error(
                     "Neither 'from_address' nor 'sender' key was found in response body:\n%s", tx_body)
@@ -1,7 +1,10 @@
 import re
 from enum import Enum
+from functools import lru_cache
 from typing import List
 
+EVM_NETWORK_PATTERN = re.compile(r"[^_-]+_[0-9]+[_-][0-9]+\Z")
+
 
 # class syntax
 class FaucetClientType(Enum):
@@ -10,6 +13,8 @@ class FaucetClientType(Enum):
 
 
 class Balance:
+    __slots__ = ('denom', 'original_denom', 'amount')
+
     def __init__(self, denom: str, amount: float, original_denom: str = None):
         self.denom = denom
         self.original_denom = original_denom or denom
@@ -17,6 +22,8 @@ class Balance:
 
 
 class NodeStatus:
+    __slots__ = ('moniker', 'chain', 'last_block', 'syncs')
+
     def __init__(self, moniker: str, chain: str, last_block: int, syncs: bool):
         self.moniker = moniker
         self.chain = chain
@@ -25,6 +32,8 @@ class NodeStatus:
 
 
 class NetworkDenomPair:
+    __slots__ = ('network_id', 'denom', 'original_denom')
+
     def __init__(self, network_id: str, denom: str, original_denom: str = None):
         self.network_id = network_id
         self.denom = denom
@@ -32,6 +41,8 @@ class NetworkDenomPair:
 
 
 class TxInfo:
+    __slots__ = ('height', 'sender', 'receiver', 'amount')
+
     def __init__(self, height: int, sender: str, receiver: str, amount: int):
         self.height = height
         self.sender = sender
@@ -61,11 +72,13 @@ class FaucetClient:
             daily_cap_evm=0,
             node_ws="",
             node_rpc="",
+            node_api="",
             node_executable="",
             address_prefix="",
     ):
         self.key = key
         self.node_rpc = node_rpc
+        self.node_api = node_api
         self.node_ws = node_ws
         self.node_executable = node_executable
         self.node_denom = node_denom
@@ -83,8 +96,21 @@ class FaucetClient:
         self.token_requests_cap = int(token_requests_cap)
         self.ibc_token_requests_cap = int(ibc_token_requests_cap)
         self.ibc_enabled = bool(ibc_enabled)
-        self.channels_to_listen = list(channels_to_listen.split(','))
+        self.channels_to_listen = frozenset(
+            channel.strip() for channel in channels_to_listen.split(',') if channel.strip())
         self.request_timeout = int(request_timeout)
+        self.request_timeout_hours = self.request_timeout // 3600
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Releases any connection held by the client
+        """
 
     def get_amount_to_send(self, network_id: str) -> int:
         """
@@ -129,8 +155,9 @@ class FaucetClient:
         pass
 
 
+@lru_cache(maxsize=256)
 def is_evm_network(network_id: str):
     """
     Returns whether the specified network is evm related
     """
-    return bool(re.search("^[^_-]+_[0-9]+[_-][0-9]+$", network_id))
+    return EVM_NETWORK_PATTERN.match(network_id) is not None
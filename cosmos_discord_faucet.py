@@ -6,16 +6,21 @@ import time
 import datetime
 import logging
 import sys
-import requests
 import aiofiles as aiof
-import toml
 import discord
 import asyncio
 import os
-from tabulate import tabulate
+import re
+import signal
+from contextlib import AsyncExitStack, suppress
 
-from clients.cosmos_client import CosmosClient
-from clients.faucet_client import FaucetClient, FaucetClientType
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+from clients.cosmos_client import CosmosClient, close_session, fetch_json
+from clients.faucet_client import Balance, FaucetClient, FaucetClientType
 from clients.substrate_client import SubstrateClient
 
 # Turn Down Discord Logging
@@ -26,44 +31,117 @@ disc_log.setLevel(logging.INFO)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
 # Load config
-config = toml.load('config.toml')
+with open('config.toml', 'rb') as config_file:
+    config = tomllib.load(config_file)
 envs = config['envs']
 network_denoms_url = config['network_denoms_url']
 
+TX_HASH_PATTERN = re.compile(r'[0-9A-Fa-f]{64}\Z')
+# Bech32, 0x hex and SS58 addresses are all alphanumeric
+ADDRESS_PATTERN = re.compile(r'[0-9A-Za-z]{8,128}\Z')
+
+# IBC network denoms rarely change, so lookups are reused for a while
+NETWORK_DENOMS_TTL = 60
+
+# The transactions log stays open while the bot runs; rows are queued and written in batches
+TRANSACTIONS_LOG = None
+TRANSACTIONS_LOG_FLUSH_PERIOD = 5
+TRANSACTIONS_LOG_BATCH_SIZE = 64
+
+# Expired rate-limit entries are pruned periodically so ACTIVE_REQUESTS stays bounded
+ACTIVE_REQUESTS_GC_PERIOD = 15 * 60
+
+# Pending transfers per client; further requests are turned away until the queue drains
+TRANSACTIONS_QUEUE_SIZE = 256
+
+# Every user may burst COMMAND_BURST times per command, then one command every 1 / COMMAND_REFILL_RATE seconds
+COMMAND_BURST = 5
+COMMAND_REFILL_RATE = 0.2
+
+
+class ActiveRequest:
+    __slots__ = ('check_time', 'requests_count')
+
+    def __init__(self, check_time: float, requests_count: int = 1):
+        self.check_time = check_time
+        self.requests_count = requests_count
+
 
-def create_client(env_key) -> FaucetClient:
-    env = envs[env_key]
-    client_type = FaucetClientType.__members__.get(env['client_type'])
+class CommandBucket:
+    __slots__ = ('tokens', 'updated', 'warned')
+
+    def __init__(self, now: float):
+        self.tokens = COMMAND_BURST
+        self.updated = now
+        self.warned = False
+
+
+async def create_client(env_key) -> FaucetClient:
+    # Copy the env so the loaded config stays intact
+    env = dict(envs[env_key])
+    client_type_name = env.pop('client_type')
+    client_type = FaucetClientType.__members__.get(client_type_name)
     if not client_type:
-        raise AttributeError("Unsupported client_type: " + env['client_type'])
+        raise AttributeError("Unsupported client_type: " + client_type_name)
 
-    del env['client_type']
     if client_type == FaucetClientType.COSMOS:
+        # Built on the loop thread, as it creates asyncio primitives
         return CosmosClient(env_key, **env)
     elif client_type == FaucetClientType.SUBSTRATE:
-        return SubstrateClient(env_key, **env)
+        # Connecting to the node and deriving the keypair block, so they run in a worker thread
+        return await asyncio.to_thread(SubstrateClient, env_key, **env)
 
 
 try:
-    CLIENTS = list(map(create_client, envs))
     CORE_TEAM_ROLE_ID = config['core_team_role_id']
-    DISCORD_TOKEN = os.environ['DISCORD_TOKEN']
-    ACTIVE_REQUESTS = {env: {} for env in envs}
-    NETWORKS_DAY_TALLY = {env: {} for env in envs}
-    TRANSACTIONS_QUEUE = {env: asyncio.Queue() for env in envs}
-    TRANSACTIONS_QUEUE_TASKS = {env: None for env in envs}
 except KeyError as key:
     logging.critical('Key could not be found: %s', key)
     sys.exit()
 
+DISCORD_TOKEN = os.environ.get('DISCORD_TOKEN')
+if not DISCORD_TOKEN:
+    logging.critical('DISCORD_TOKEN environment variable is not set')
+    sys.exit()
+
+# Clients are created in main(), see create_clients
+CLIENTS = []
+ACTIVE_REQUESTS = {env: {} for env in envs}
+NETWORKS_DAY_TALLY = {env: {} for env in envs}
+NETWORK_DENOMS = {env: {} for env in envs}
+TRANSACTIONS_QUEUE = {env: asyncio.Queue(maxsize=TRANSACTIONS_QUEUE_SIZE) for env in envs}
+TRANSACTIONS_LOG_QUEUE = asyncio.Queue()
+COMMAND_BUCKETS = {}
+
 APPROVE_EMOJI = '✅'
 INFO_EMOJI = 'ℹ️'
 REJECT_EMOJI = '🚫'
 WARNING_EMOJI = '❗'
 GENERIC_ERROR_MESSAGE = f'{WARNING_EMOJI} Could not handle your request'
-
-intents = discord.Intents.all()
-discord_client = discord.Client(intents=intents)
+SLOW_DOWN_MESSAGE = f'{WARNING_EMOJI} Too many commands, please slow down'
+HOW_MANY_TIMES = {2: 'twice'}
+FAUCET_STATUS_TEMPLATE = (
+    '```\n'
+    'Node moniker:      {moniker}\n'
+    'Node last block:   {last_block}\n'
+    'Faucet address:    {faucet_address}\n'
+    '```')
+TX_INFO_TEMPLATE = (
+    '```From:    {sender}\n'
+    'To:      {receiver}\n'
+    'Amount:  {amount}\n'
+    'Height:  {height}\n```')
+
+# Only guild text messages are handled; guilds is needed for channel names and roles
+intents = discord.Intents.none()
+intents.guilds = True
+intents.guild_messages = True
+if hasattr(intents, 'message_content'):
+    intents.message_content = True
+discord_client = discord.Client(
+    intents=intents,
+    max_messages=None,
+    member_cache_flags=discord.MemberCacheFlags.none(),
+    chunk_guilds_at_startup=False)
 
 
 def get_help_message(client: FaucetClient):
@@ -92,26 +170,45 @@ def get_help_message(client: FaucetClient):
     return message
 
 
-def get_param_value(message, param_index):
+HELP_MESSAGES = {}
+CHANNEL_CLIENTS = {}
+
+
+async def create_clients():
+    """
+    Create every faucet client concurrently, as substrate clients connect to their node when created,
+    then build the help messages and the channel to clients map
+    """
+    CLIENTS.extend(await asyncio.gather(*(create_client(env_key) for env_key in envs)))
+    for client in CLIENTS:
+        HELP_MESSAGES[client.key] = get_help_message(client)
+        for channel in client.channels_to_listen:
+            CHANNEL_CLIENTS.setdefault(channel, []).append(client)
+
+
+def get_param_value(params, param_index):
     """
-    Fetch the param value from the specified message at the specified index
+    Fetch the param value from the message params at the specified index
     """
-    params = list(message.content.split()[1:])  # remove the command name
     if len(params) <= param_index:
         return ""
 
-    return str(params[param_index]).strip()
+    return params[param_index]
 
 
-async def get_and_validate_address_from_params(client: FaucetClient, message, param_index):
+async def get_and_validate_address_from_params(client: FaucetClient, message, params, param_index):
     """
-    Fetch and validate the address from the specified message
+    Fetch and validate the address from the specified message params
     """
-    address = get_param_value(message, param_index)
+    address = get_param_value(params, param_index)
     if not address:
         await message.reply(f'{WARNING_EMOJI} Missing address')
         return
 
+    if not ADDRESS_PATTERN.match(address):
+        await message.reply(f'{WARNING_EMOJI} Invalid address')
+        return
+
     address = await client.fetch_bech32_address(address)
     if not address.startswith(client.address_prefix):
         await message.reply(f'{WARNING_EMOJI} Expected `{client.address_prefix}` prefix')
@@ -120,73 +217,135 @@ async def get_and_validate_address_from_params(client: FaucetClient, message, pa
         return address
 
 
-async def save_transaction_statistics(transaction: str):
+async def fetch_network_denom(client: FaucetClient, network_id: str):
+    """
+    Fetch the faucet denom for the specified network, or None if the faucet holds no such tokens
+    """
+    if network_id == client.node_chain_id:
+        return {"denom": client.node_denom, "baseDenom": client.node_denom}
+
+    cached = NETWORK_DENOMS[client.key].get(network_id)
+    if cached and cached['expires'] > time.monotonic():
+        return cached['network_denom']
+
+    network_denom = await fetch_json(
+        network_denoms_url, params={'networkId': client.node_chain_id, 'ibcNetworkId': network_id})
+    # Unknown networks are cached too, so repeated typos do not reach the denoms service
+    NETWORK_DENOMS[client.key][network_id] = \
+        {'expires': time.monotonic() + NETWORK_DENOMS_TTL, 'network_denom': network_denom}
+    return network_denom
+
+
+async def get_address_and_network_denom(client: FaucetClient, message, params, network_id: str):
+    """
+    Validate the address from the message params, then fetch the network denom for a valid address
+    """
+    address = await get_and_validate_address_from_params(client, message, params, 0)
+    if not address:
+        return None, None
+    return address, await fetch_network_denom(client, network_id)
+
+
+def save_transaction_statistics(transaction: str):
     """
     Transaction strings are already comma-separated
     """
-    async with aiof.open('transactions.csv', 'a') as csv_file:
-        await csv_file.write(f'{transaction}\n')
-        await csv_file.flush()
+    TRANSACTIONS_LOG_QUEUE.put_nowait(f'{transaction}\n')
 
 
-async def balance_request(client: FaucetClient, message):
+async def write_transaction_statistics():
+    """
+    Write queued transactions to the log in batches, flushing every TRANSACTIONS_LOG_FLUSH_PERIOD seconds
+    Returns once a None row is queued
+    """
+    flush_time = time.monotonic() + TRANSACTIONS_LOG_FLUSH_PERIOD
+    running = True
+    while running:
+        rows = []
+        try:
+            rows.append(await asyncio.wait_for(
+                TRANSACTIONS_LOG_QUEUE.get(), timeout=max(flush_time - time.monotonic(), 0)))
+        except asyncio.TimeoutError:
+            pass
+        while rows and len(rows) < TRANSACTIONS_LOG_BATCH_SIZE and not TRANSACTIONS_LOG_QUEUE.empty():
+            rows.append(TRANSACTIONS_LOG_QUEUE.get_nowait())
+
+        if None in rows:
+            rows.remove(None)
+            running = False
+        if rows:
+            await TRANSACTIONS_LOG.write(''.join(rows))
+        if not running or time.monotonic() >= flush_time:
+            await TRANSACTIONS_LOG.flush()
+            flush_time = time.monotonic() + TRANSACTIONS_LOG_FLUSH_PERIOD
+
+
+async def close_transaction_statistics(writer_task: asyncio.Task):
+    """
+    Let the writer drain the queued transactions before the log is closed
+    """
+    TRANSACTIONS_LOG_QUEUE.put_nowait(None)
+    await writer_task
+
+
+def format_balance(balance: Balance):
+    """
+    Render the balance as a single-row, header-less table
+    """
+    amount = str(balance.amount)
+    rule = f'{"-" * len(balance.denom)}  {"-" * len(amount)}'
+    return f'{rule}\n{balance.denom}  {amount}\n{rule}'
+
+
+async def balance_request(client: FaucetClient, message, params):
     """
     Provide the balance for a given address
     """
     try:
-        address = await get_and_validate_address_from_params(client, message, 0)
+        network_id = get_param_value(params, 1)
+        if not client.ibc_enabled or not network_id:
+            network_id = client.node_chain_id
+
+        address, network_denom = await get_address_and_network_denom(client, message, params, network_id)
         if not address:
             return
 
-        denom = client.node_denom
-        network_id = get_param_value(message, 1)
-        if client.ibc_enabled and network_id and network_id != client.node_chain_id:
-            response = requests.get(f'{network_denoms_url}?networkId={client.node_chain_id}&ibcNetworkId={network_id}')
-            network_denom = response.json()
-            if network_denom:
-                denom = network_denom['denom']
-            else:
-                denom = None
-
-        if denom:
-            balance = await client.get_balance(address, denom)
+        if network_denom:
+            balance = await client.get_balance(address, network_denom['denom'])
         else:
             balance = None
 
         if not balance:
             await message.reply(f'No balance for address `{address}`')
         else:
-            data = [{"denom": balance.denom, "amount": balance.amount}]
-            await message.reply(f'Balance for address `{address}`:\n```{tabulate(data, floatfmt=",.0f")}\n```\n')
+            await message.reply(f'Balance for address `{address}`:\n```{format_balance(balance)}\n```\n')
 
     except Exception as error:
         logging.error('Balance request failed: %s', error)
         await message.reply(GENERIC_ERROR_MESSAGE)
 
 
-async def faucet_status(client: FaucetClient, message):
+async def faucet_status(client: FaucetClient, message, params):
     """
     Provide node and faucet info
     """
     try:
         node_status = await client.get_node_status()
         if node_status:
-            await message.reply(
-                f'```\n'
-                f'Node moniker:      {node_status.moniker}\n'
-                f'Node last block:   {node_status.last_block}\n'
-                f'Faucet address:    {client.faucet_address}\n'
-                f'```')
+            await message.reply(FAUCET_STATUS_TEMPLATE.format(
+                moniker=node_status.moniker,
+                last_block=node_status.last_block,
+                faucet_address=client.faucet_address))
     except Exception as error:
         logging.error('Faucet status request failed: %s', error)
         await message.reply(GENERIC_ERROR_MESSAGE)
 
 
-async def transaction_info(client: FaucetClient, message):
+async def transaction_info(client: FaucetClient, message, params):
     """
     Provide info on a specific transaction
     """
-    transaction_hash = get_param_value(message, 0)
+    transaction_hash = get_param_value(params, 0)
     if not transaction_hash:
         await message.reply(f'{WARNING_EMOJI} Missing transaction hash ID')
         return
@@ -195,91 +354,138 @@ async def transaction_info(client: FaucetClient, message):
         await message.reply(f'{WARNING_EMOJI} Hash ID must be 64 characters long, received `{len(transaction_hash)}`')
         return
 
+    if not TX_HASH_PATTERN.match(transaction_hash):
+        await message.reply(f'{WARNING_EMOJI} Hash ID must be hexadecimal')
+        return
+
     try:
         res = await client.get_tx_info(transaction_hash)
-        await message.reply(
-            f'```From:    {res.sender}\n'
-            f'To:      {res.receiver}\n'
-            f'Amount:  {res.amount}\n'
-            f'Height:  {res.height}\n```')
+        await message.reply(TX_INFO_TEMPLATE.format(
+            sender=res.sender, receiver=res.receiver, amount=res.amount, height=res.height))
 
     except Exception as error:
         logging.error('Transaction info request failed: %s', error)
         await message.reply(GENERIC_ERROR_MESSAGE)
 
 
-def on_time_blocked(client: FaucetClient, network_id: str, requester: str, message_timestamp):
+def on_time_blocked(network_requests: dict, client: FaucetClient, network_id: str, requester: str,
+                    message_timestamp):
     """
-    Returns True, None if the given requester are not time-blocked for the specified network
-    Returns False, reply if either of them is still on time-out; msg is the reply to the requester
+    Returns True, None, request if the given requester are not time-blocked for the specified network;
+    request is the requester's active request window, or None if there is none
+    Returns False, reply, request if either of them is still on time-out; msg is the reply to the requester
     """
-    if requester in ACTIVE_REQUESTS[client.key][network_id]:
-        request = ACTIVE_REQUESTS[client.key][network_id][requester]
-        check_time = request['check_time']
-        requests_count = request['requests_count']
-        token_requests_cap = client.get_token_requests_cap(network_id)
-
-        if check_time > message_timestamp and requests_count >= token_requests_cap:
-            seconds_left = check_time - message_timestamp
-            minutes_left = seconds_left / 60
-            if minutes_left > 120:
-                wait_time = str(int(minutes_left / 60)) + ' hours'
-            else:
-                wait_time = str(int(minutes_left)) + ' minutes'
-            timeout_in_hours = int(client.request_timeout / 60 / 60)
-
-            how_many = 'once'
-            if token_requests_cap == 2:
-                how_many = 'twice'
-            elif token_requests_cap > 2:
-                how_many = f'{token_requests_cap} times'
-            reply = f'{REJECT_EMOJI} You can request `{network_id}` tokens no more than {how_many} every ' \
-                    f'{timeout_in_hours} hours, please try again in {wait_time}'
-            return False, reply
-
-        if check_time > message_timestamp:
-            request['requests_count'] += 1
+    request = network_requests.get(requester)
+    if request is None or request.check_time <= message_timestamp:
+        return True, None, None
+
+    token_requests_cap = client.get_token_requests_cap(network_id)
+    if request.requests_count >= token_requests_cap:
+        minutes_left = int(request.check_time - message_timestamp) // 60
+        if minutes_left > 120:
+            wait_time = f'{minutes_left // 60} hours'
+        else:
+            wait_time = f'{minutes_left} minutes'
+        if token_requests_cap > 2:
+            how_many = f'{token_requests_cap} times'
         else:
-            del ACTIVE_REQUESTS[client.key][network_id][requester]
+            how_many = HOW_MANY_TIMES.get(token_requests_cap, 'once')
+        reply = f'{REJECT_EMOJI} You can request `{network_id}` tokens no more than {how_many} every ' \
+                f'{client.request_timeout_hours} hours, please try again in {wait_time}'
+        return False, reply, request
 
-    return True, None
+    return True, None, request
 
 
 def check_time_limits(client: FaucetClient, network_id: str, requester: str, address: str):
     """
     Returns True, None if the given requester and address are not time-blocked for the specified network
     Returns False, reply if either of them is still on time-out; msg is the reply to the requester
+    Both are checked before either request window is updated
     """
     message_timestamp = time.time()
-    approved, reply = on_time_blocked(client, network_id, requester, message_timestamp)
+    network_requests = ACTIVE_REQUESTS[client.key][network_id]
+    approved, reply, requester_request = on_time_blocked(
+        network_requests, client, network_id, requester, message_timestamp)
     if not approved:
         return approved, reply
 
-    approved, reply = on_time_blocked(client, network_id, address, message_timestamp)
+    approved, reply, address_request = on_time_blocked(
+        network_requests, client, network_id, address, message_timestamp)
     if not approved:
         return approved, reply
 
-    if requester not in ACTIVE_REQUESTS[client.key][network_id] \
-            and address not in ACTIVE_REQUESTS[client.key][network_id]:
-        ACTIVE_REQUESTS[client.key][network_id][requester] = \
-            {"check_time": message_timestamp + client.request_timeout, "requests_count": 1}
-        ACTIVE_REQUESTS[client.key][network_id][address] = \
-            {"check_time": message_timestamp + client.request_timeout, "requests_count": 1}
+    check_time = message_timestamp + client.request_timeout
+    for key, request in ((requester, requester_request), (address, address_request)):
+        if request is None:
+            network_requests[key] = ActiveRequest(check_time)
+        else:
+            request.requests_count += 1
 
     return True, None
 
 
+async def prune_active_requests():
+    """
+    Drop expired ACTIVE_REQUESTS and NETWORK_DENOMS entries and refilled COMMAND_BUCKETS
+    every ACTIVE_REQUESTS_GC_PERIOD seconds
+    """
+    while True:
+        await asyncio.sleep(ACTIVE_REQUESTS_GC_PERIOD)
+        now = time.time()
+        for network_requests in ACTIVE_REQUESTS.values():
+            for requests_by_key in network_requests.values():
+                expired = [key for key, request in requests_by_key.items() if request.check_time <= now]
+                for key in expired:
+                    del requests_by_key[key]
+
+        now = time.monotonic()
+        refilled = [key for key, bucket in COMMAND_BUCKETS.items()
+                    if bucket.tokens + (now - bucket.updated) * COMMAND_REFILL_RATE >= COMMAND_BURST]
+        for key in refilled:
+            del COMMAND_BUCKETS[key]
+
+        for network_denoms in NETWORK_DENOMS.values():
+            expired = [network_id for network_id, cached in network_denoms.items() if cached['expires'] <= now]
+            for network_id in expired:
+                del network_denoms[network_id]
+
+
+def consume_command_token(user_id: int, command: str):
+    """
+    Returns True, False after taking a token from the user's bucket for the command
+    Returns False, warn if the bucket is empty; warn is True only on the first rejection in a row
+    """
+    now = time.monotonic()
+    bucket = COMMAND_BUCKETS.get((user_id, command))
+    if bucket is None:
+        bucket = COMMAND_BUCKETS[(user_id, command)] = CommandBucket(now)
+
+    bucket.tokens = min(COMMAND_BURST, bucket.tokens + (now - bucket.updated) * COMMAND_REFILL_RATE)
+    bucket.updated = now
+    if bucket.tokens < 1:
+        warn = not bucket.warned
+        bucket.warned = True
+        return False, warn
+
+    bucket.tokens -= 1
+    bucket.warned = False
+    return True, False
+
+
 def check_daily_cap(client: FaucetClient, network_id: str):
     """
     Returns True if the faucet has not reached the daily cap for the specified network
     Returns False otherwise
     """
     delta = client.get_amount_to_send(network_id)
-    today = datetime.datetime.today().date()
-    network_day_tally = NETWORKS_DAY_TALLY[client.key].get(network_id, None)
+    # Days since the epoch (UTC), so the rollover check is an int comparison
+    today = int(time.time() // 86400)
+    day_tallies = NETWORKS_DAY_TALLY[client.key]
+    network_day_tally = day_tallies.get(network_id)
     if not network_day_tally or today != network_day_tally['active_day']:
         # The date has changed, reset the tally
-        NETWORKS_DAY_TALLY[client.key][network_id] = {'active_day': today, "day_tally": delta}
+        day_tallies[network_id] = {'active_day': today, "day_tally": delta}
         return True
 
     # Check tally
@@ -292,35 +498,29 @@ def check_daily_cap(client: FaucetClient, network_id: str):
 
 
 def revert_daily_consume(client: FaucetClient, network_id: str):
-    network_day_tally = NETWORKS_DAY_TALLY[client.key].get(network_id, None)
+    network_day_tally = NETWORKS_DAY_TALLY[client.key].get(network_id)
     if network_day_tally:
         delta = client.get_amount_to_send(network_id)
         network_day_tally['day_tally'] -= delta
 
 
-async def token_request(client: FaucetClient, message):
+async def token_request(client: FaucetClient, message, params):
     """
     Send tokens to the specified address
     """
     try:
         requester = message.author
-        address = await get_and_validate_address_from_params(client, message, 0)
+        network_id = get_param_value(params, 1)
+        if not client.ibc_enabled or not network_id:
+            network_id = client.node_chain_id
+
+        address, network_denom = await get_address_and_network_denom(client, message, params, network_id)
         if not address:
             return
 
-        network_id = get_param_value(message, 1)
-        if not network_id:
-            network_id = client.node_chain_id
-
         if network_id not in ACTIVE_REQUESTS[client.key]:
             ACTIVE_REQUESTS[client.key][network_id] = {}
 
-        if network_id != client.node_chain_id:
-            response = requests.get(f'{network_denoms_url}?networkId={client.node_chain_id}&ibcNetworkId={network_id}')
-            network_denom = response.json()
-        else:
-            network_denom = {"denom": client.node_denom, "baseDenom": client.node_denom}
-
         if not network_denom:
             logging.info('%s requested %s tokens for %s but the faucet has no balance for this token',
                          requester, network_id, address)
@@ -340,13 +540,19 @@ async def token_request(client: FaucetClient, message):
         return
 
     # Add send-message to the transactions queue
-    transactions_queue = TRANSACTIONS_QUEUE.get(client.key)
-    asyncio.create_task(transactions_queue.put({
-        "message": message,
-        "address": address,
-        "network_id": network_id,
-        "network_denom": network_denom,
-    }))
+    try:
+        TRANSACTIONS_QUEUE[client.key].put_nowait({
+            "message": message,
+            "address": address,
+            "network_id": network_id,
+            "network_denom": network_denom,
+        })
+    except asyncio.QueueFull:
+        revert_daily_consume(client, network_id)
+        logging.warning('%s requested %s tokens for %s but the transactions queue is full',
+                        requester, network_id, address)
+        await message.reply(f'{WARNING_EMOJI} The faucet is busy, please try again shortly')
+        return
     logging.info('%s requested %s tokens for %s', requester, network_id, address)
     await message.reply(f'{INFO_EMOJI} Request accepted and is in queue, please wait for a successful response.')
 
@@ -364,8 +570,7 @@ async def process_transactions_queue(queue: asyncio.Queue, client: FaucetClient)
             is_core_team = False
 
             try:
-                core_team_role = discord.utils.get(requester.guild.roles, id=CORE_TEAM_ROLE_ID)
-                is_core_team = core_team_role in requester.roles
+                is_core_team = any(role.id == CORE_TEAM_ROLE_ID for role in requester.roles)
 
                 # Check whether user or address have received tokens on this testnet
                 approved, reply = is_core_team, ''
@@ -377,7 +582,7 @@ async def process_transactions_queue(queue: asyncio.Queue, client: FaucetClient)
                     continue
 
                 balance = await client.get_balance(client.faucet_address, network_denom['denom'])
-                if not balance or (float(balance.amount) < float(client.get_amount_to_send(network_id))):
+                if not balance or int(balance.amount) < client.get_amount_to_send(network_id):
                     revert_daily_consume(client, network_id)
                     await message.reply(f'Faucet is drained out - new {network_denom["baseDenom"]} soon')
                     continue
@@ -394,17 +599,19 @@ async def process_transactions_queue(queue: asyncio.Queue, client: FaucetClient)
                         f'{APPROVE_EMOJI} Your tx is approved. To view your tx status, type `$tx_info {transfer}`')
 
                 # save to transaction log
-                await save_transaction_statistics(
-                    f'{now.isoformat(timespec="seconds")},'
-                    f'{network_id},{address},'
-                    f'{amount_to_send}{network_denom["denom"]},'
-                    f'{transfer},'
-                    f'{balance}')
+                save_transaction_statistics(','.join((
+                    now.isoformat(timespec="seconds"),
+                    network_id,
+                    address,
+                    amount,
+                    transfer,
+                    f'{balance.amount}{balance.denom}')))
 
             except Exception as error:
                 if not is_core_team:
-                    del ACTIVE_REQUESTS[client.key][network_id][requester]
-                    del ACTIVE_REQUESTS[client.key][network_id][address]
+                    network_requests = ACTIVE_REQUESTS[client.key][network_id]
+                    network_requests.pop(requester.id, None)
+                    network_requests.pop(address, None)
                     revert_daily_consume(client, network_id)
                 logging.error('Token request failed: %s', error)
                 await message.reply(GENERIC_ERROR_MESSAGE)
@@ -415,6 +622,17 @@ async def process_transactions_queue(queue: asyncio.Queue, client: FaucetClient)
         finally:
             queue.task_done()
 
+        # queue.get() does not suspend while the queue is non-empty, so yield to other tasks between transfers
+        await asyncio.sleep(0)
+
+
+COMMANDS = {
+    '$balance': balance_request,
+    '$faucet_status': faucet_status,
+    '$tx_info': transaction_info,
+    '$request': token_request,
+}
+
 
 @discord_client.event
 async def on_ready():
@@ -429,31 +647,62 @@ async def on_message(message):
     """
     Responds to messages on specified channels.
     """
-    # Do not listen to your own messages
-    if not message.content.startswith('$') or message.author == discord_client.user:
+    # Do not listen to your own messages, nor to anything that is not a command
+    if message.author.id == discord_client.user.id or not message.content.startswith('$'):
         return
 
-    for client in CLIENTS:
-        # Every client listen in specific channels
-        if message.channel.name not in client.channels_to_listen:
-            continue
-
-        transaction_queue_task = TRANSACTIONS_QUEUE_TASKS[client.key]
-        if not transaction_queue_task or transaction_queue_task.cancelled():
-            transaction_queue = TRANSACTIONS_QUEUE[client.key]
-            TRANSACTIONS_QUEUE_TASKS[client.key] = asyncio.create_task(
-                process_transactions_queue(transaction_queue, client))
-
-        if message.content.startswith('$balance'):
-            await balance_request(client, message)
-        elif message.content.startswith('$faucet_status'):
-            await faucet_status(client, message)
-        elif message.content.startswith('$tx_info'):
-            await transaction_info(client, message)
-        elif message.content.startswith('$request '):
-            await token_request(client, message)
+    # Every client listen in specific channels
+    clients = CHANNEL_CLIENTS.get(message.channel.name)
+    if not clients:
+        return
+
+    # Split once; handlers read at most two params
+    command, *params = message.content.split(maxsplit=3)
+    handler = COMMANDS.get(command)
+
+    # Throttle before any node call; unknown commands share one bucket
+    allowed, warn = consume_command_token(message.author.id, command if handler else '')
+    if not allowed:
+        if warn:
+            await message.reply(SLOW_DOWN_MESSAGE)
+        return
+    for client in clients:
+        if handler:
+            await handler(client, message, params)
         else:
-            await message.reply(get_help_message(client))
+            await message.reply(HELP_MESSAGES[client.key])
 
 
-discord_client.run(DISCORD_TOKEN)
+async def main():
+    """
+    Runs the bot, closing every faucet client and the transactions log once it stops
+    """
+    global TRANSACTIONS_LOG
+    try:
+        await create_clients()
+    except KeyError as key:
+        logging.critical('Key could not be found: %s', key)
+        return
+
+    async with AsyncExitStack() as stack:
+        # The shared HTTP session belongs to main(); registered first so it closes after every client
+        stack.push_async_callback(close_session)
+        for client in CLIENTS:
+            await stack.enter_async_context(client)
+            queue_task = asyncio.create_task(process_transactions_queue(TRANSACTIONS_QUEUE[client.key], client))
+            stack.callback(queue_task.cancel)
+        TRANSACTIONS_LOG = await stack.enter_async_context(aiof.open('transactions.csv', 'a'))
+        writer_task = asyncio.create_task(write_transaction_statistics())
+        stack.push_async_callback(close_transaction_statistics, writer_task)
+        prune_task = asyncio.create_task(prune_active_requests())
+        stack.callback(prune_task.cancel)
+        # Closing the client makes start() return, so the stack unwinds and flushes the log
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError):
+                loop.add_signal_handler(signal_number, lambda: asyncio.create_task(discord_client.close()))
+        await discord_client.start(DISCORD_TOKEN)
+
+
+if __name__ == '__main__':
+    discord_client.loop.run_until_complete(main())
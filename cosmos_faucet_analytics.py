@@ -19,9 +19,13 @@ Outputs per chain:
 import sys
 import logging
 from time import sleep
-import toml
 from cosmos_transaction_reader import TransactionReader
 
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
 
 class FaucetAnalytics():
     """
@@ -72,7 +76,8 @@ if __name__ == '__main__':
                         format='%(asctime)s %(levelname)s %(message)s')
 
     # Load config
-    config = toml.load('config_analytics.toml')
+    with open('config_analytics.toml', 'rb') as config_file:
+        config = tomllib.load(config_file)
     try:
         tx_log = config['transactions_log']
         ne_log = config['node_exporter_log']
@@ -0,0 +1,36 @@
+import importlib
+import sys
+
+import pytest
+
+for module in ('discord', 'aiofiles', 'aiohttp', 'bech32', 'substrateinterface'):
+    pytest.importorskip(module)
+
+CONFIG = """
+core_team_role_id = 1
+network_denoms_url = "http://localhost"
+
+[envs]
+"""
+
+
+@pytest.fixture
+def load_faucet(tmp_path, monkeypatch):
+    """
+    Imports the bot module against a config.toml written to tmp_path
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DISCORD_TOKEN', 'token')
+
+    def load(config=CONFIG):
+        (tmp_path / 'config.toml').write_text(config)
+        sys.modules.pop('cosmos_discord_faucet', None)
+        return importlib.import_module('cosmos_discord_faucet')
+
+    yield load
+    sys.modules.pop('cosmos_discord_faucet', None)
+
+
+@pytest.fixture
+def faucet(load_faucet):
+    return load_faucet()
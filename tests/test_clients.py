@@ -0,0 +1,59 @@
+"""
+Faucet clients are created from the envs in config.toml when the bot starts and closed when it stops
+"""
+import threading
+
+from conftest import CONFIG
+
+COSMOS_ENV = """
+    [envs.local]
+    node_rpc = "http://localhost:36657"
+    node_executable = "dymd"
+    node_denom = "udym"
+    node_chain_id = "dymension_100-1"
+    network_name = "dymension"
+    faucet_address = "dym1ctqdmjt7hntk2lxskgkphx73frt5h4f44ehjhx"
+    address_prefix = "dym1"
+    amount_to_send = "200000000"
+    amount_to_send_evm = "200000000000000000000"
+    daily_cap = "2000000000000"
+    daily_cap_evm = "2000000000000000000000000"
+    tx_fees = "50000"
+    token_requests_cap = 6
+    ibc_token_requests_cap = 6
+    ibc_enabled = true
+    channels_to_listen = "faucet"
+    request_timeout = "604800"
+    client_type = "COSMOS"
+"""
+
+
+def test_create_clients_builds_cosmos_clients(load_faucet):
+    faucet = load_faucet(CONFIG + COSMOS_ENV)
+
+    faucet.discord_client.loop.run_until_complete(faucet.create_clients())
+
+    [client] = faucet.CLIENTS
+    assert isinstance(client, faucet.CosmosClient)
+    assert faucet.CHANNEL_CLIENTS == {'faucet': [client]}
+
+
+def test_substrate_client_closes_its_interface(faucet):
+    class Interface:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    # Skip __init__, which connects to the node
+    client = faucet.SubstrateClient.__new__(faucet.SubstrateClient)
+    client.substrate = Interface()
+    client.substrate_lock = threading.Lock()
+
+    async def enter_and_exit():
+        async with client:
+            pass
+
+    faucet.discord_client.loop.run_until_complete(enter_and_exit())
+
+    assert client.substrate.closed
@@ -0,0 +1,30 @@
+"""
+Stopping the bot must unwind main() and flush queued transaction rows
+"""
+import asyncio
+import os
+import signal
+
+
+def test_sigterm_flushes_pending_transaction_rows(faucet, tmp_path, monkeypatch):
+    closed = asyncio.Event()
+
+    async def start(token):
+        faucet.save_transaction_statistics('row,1')
+        faucet.save_transaction_statistics('row,2')
+        os.kill(os.getpid(), signal.SIGTERM)
+        await closed.wait()
+
+    async def close():
+        closed.set()
+
+    monkeypatch.setattr(faucet.discord_client, 'start', start)
+    monkeypatch.setattr(faucet.discord_client, 'close', close)
+    loop = faucet.discord_client.loop
+    try:
+        loop.run_until_complete(asyncio.wait_for(faucet.main(), timeout=10))
+    finally:
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(signal_number)
+
+    assert (tmp_path / 'transactions.csv').read_text() == 'row,1\nrow,2\n'